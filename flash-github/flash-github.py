@@ -1,11 +1,23 @@
-from typing import Any, List, Optional, Dict
+from typing import Any, Optional, Dict, Tuple
 import os
-import pathlib
+import asyncio
 import base64
-import fnmatch
+import pathlib
+import posixpath
+import shutil
+import threading
+import hashlib
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from github import Github, Auth
+from urllib.parse import quote
+import diskcache
+import pathspec
+import requests
+from requests.adapters import HTTPAdapter
+from github import Github, Auth, GithubException, GithubRetry, InputGitTreeElement, UnknownObjectException
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
@@ -23,13 +35,189 @@ if not GITHUB_API_TOKEN:
     print("Error: GITHUB_API_TOKEN not found in .env file")
     exit(1)
 
-# Initialize GitHub API client
+# Size of the HTTPS connection pool shared by all GitHub API requests
+GITHUB_POOL_SIZE = 64
+
+# Maximum number of concurrent raw file downloads (served by GitHub's CDN, which
+# does not count against the REST API rate limit)
+MAX_CONCURRENT_DOWNLOADS = 32
+
+# Maximum number of concurrent blob uploads (kept low: GitHub's secondary rate limits
+# penalize bursts of content-creating requests)
+MAX_CONCURRENT_UPLOADS = 8
+
+# Base URL of the GitHub REST API
+GITHUB_API_URL = "https://api.github.com/"
+
+# Base URL for downloading raw file contents
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+
+# Size of the chunks used when streaming or hashing file contents
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Number of worker threads used to read and hash local files
+LOCAL_IO_WORKERS = 16
+
+# Persistent cache for repository trees and file contents
+CACHE_DIR = os.path.expanduser("~/.cache/flash-github")
+
+# Maximum number of file paths and errors listed in a tool result (the rest are only counted)
+MAX_LISTED_FILES = 10
+MAX_LISTED_ERRORS = 5
+
+# Seconds repository metadata looked up by name is reused across tool calls
+REPO_CACHE_TTL = 300
+
+# Maximum number of repositories kept in the in-memory repository cache
+REPO_CACHE_SIZE = 128
+
+# Once fewer REST API requests than this remain, spread the rest evenly until the limit resets
+RATE_LIMIT_THRESHOLD = 100
+
+# Retry transient server errors and rate-limited requests with exponential backoff, honoring
+# Retry-After (403 rate-limit responses are handled by GithubRetry as well)
+GITHUB_RETRY = GithubRetry(total=5, backoff_factor=1, status_forcelist=[429, 502, 503, 504])
+
+
+class RateLimiter:
+    """
+    Paces GitHub REST API requests using the rate limit headers of previous responses.
+    Only the core rate limit is tracked; search and GraphQL have their own budgets.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.next_allowed_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, headers) -> None:
+        """Record the rate limit state reported by a response."""
+        if headers.get("X-RateLimit-Resource") != "core":
+            return
+
+        self.record(int(headers["X-RateLimit-Remaining"]), float(headers["X-RateLimit-Reset"]))
+
+    def record(self, remaining: int, reset_at: float) -> None:
+        """Record the remaining core requests and when the limit resets."""
+        with self._lock:
+            self.remaining = remaining
+            self.reset_at = reset_at
+
+    def reserve(self) -> float:
+        """Reserve a slot for the next request and return how many seconds to wait for it."""
+        with self._lock:
+            now = time.time()
+            if self.remaining is None or self.remaining >= self.threshold or self.reset_at <= now:
+                return 0.0
+
+            # Nothing left: any request before the reset would be rejected
+            if self.remaining <= 0:
+                return self.reset_at - now
+
+            start = max(now, self.next_allowed_at)
+            self.next_allowed_at = start + (self.reset_at - now) / self.remaining
+            return start - now
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTP adapter that waits for the rate limiter before each request and feeds it every response."""
+
+    def __init__(self, rate_limiter: RateLimiter, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        time.sleep(self.rate_limiter.reserve())
+        response = super().send(request, **kwargs)
+        self.rate_limiter.update(response.headers)
+        return response
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_THRESHOLD)
+
+# Initialize GitHub API client with a pooled keep-alive session, so consecutive
+# requests reuse the same TLS connection
 auth = Auth.Token(GITHUB_API_TOKEN)
-g = Github(auth=auth)
+g = Github(auth=auth, retry=GITHUB_RETRY, pool_size=GITHUB_POOL_SIZE)
+
+# PyGithub shares a single connection object between callers, so its calls are
+# serialized; requests fanned out in parallel go through a separate pooled session
+_github_lock = asyncio.Lock()
+_download_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+_upload_semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+http = requests.Session()
+http.headers.update({"Authorization": f"token {GITHUB_API_TOKEN}"})
+http.mount("https://", HTTPAdapter(
+    pool_connections=GITHUB_POOL_SIZE,
+    pool_maxsize=GITHUB_POOL_SIZE,
+    max_retries=GITHUB_RETRY
+))
+http.mount(GITHUB_API_URL, RateLimitedAdapter(
+    rate_limiter,
+    pool_connections=GITHUB_POOL_SIZE,
+    pool_maxsize=GITHUB_POOL_SIZE,
+    max_retries=GITHUB_RETRY
+))
+
+# Local file reads and hashing run here so disk I/O overlaps with network requests
+_io_pool = ThreadPoolExecutor(max_workers=LOCAL_IO_WORKERS)
+
+# Trees are cached by commit SHA and blobs by blob SHA; neither ever changes for
+# a given SHA, so they never expire
+cache = diskcache.Cache(CACHE_DIR)
+
+# The authenticated user doesn't change for the lifetime of the process
+_authenticated_user = None
+
+# Repositories by lowercased full name, most recently used last, as (fetched at, repository)
+_repositories: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+# Repository information and the contents of a path, fetched in one round-trip
+BROWSE_REPOSITORY_QUERY = """
+query($owner: String!, $name: String!, $expression: String!, $includeContent: Boolean!) {
+  repository(owner: $owner, name: $name) {
+    nameWithOwner
+    url
+    sshUrl
+    description
+    primaryLanguage { name }
+    stargazerCount
+    forkCount
+    issues(states: OPEN) { totalCount }
+    pullRequests(states: OPEN) { totalCount }
+    createdAt
+    updatedAt
+    pushedAt
+    licenseInfo { name }
+    isPrivate
+    defaultBranchRef { name }
+    object(expression: $expression) {
+      __typename
+      ... on Blob {
+        oid
+        byteSize
+        isBinary
+        isTruncated
+        text @include(if: $includeContent)
+      }
+      ... on Tree {
+        entries {
+          name
+          path
+          type
+        }
+      }
+    }
+  }
+}
+"""
 
 
 @mcp.tool()
-async def search_repositories(query: str, limit: int = 10) -> str:
+async def search_repositories(query: str, limit: int = 10) -> Dict[str, Any]:
     """
     Search for repositories on GitHub based on a query.
 
@@ -38,31 +226,28 @@ async def search_repositories(query: str, limit: int = 10) -> str:
         limit: Maximum number of repositories to return (default: 10)
     """
     try:
-        repositories = g.search_repositories(query)
-        results = []
-
-        for i, repo in enumerate(repositories[:limit]):
-            results.append(f"Repository {i + 1}:")
-            results.append(f"  Name: {repo.name}")
-            results.append(f"  Full Name: {repo.full_name}")
-            results.append(f"  URL: {repo.html_url}")
-            results.append(f"  Description: {repo.description}")
-            results.append(f"  Stars: {repo.stargazers_count}")
-            results.append(f"  Forks: {repo.forks_count}")
-            results.append(f"  Last Updated: {repo.updated_at}")
-            results.append("")
-
-        if not results:
-            return "No repositories found matching your query."
-
-        return "\n".join(results)
+        repositories = await _github_query(lambda: list(g.search_repositories(query)[:limit]))
+
+        return {
+            "repositories": [
+                {
+                    "name": repo.name,
+                    "full_name": repo.full_name,
+                    "url": repo.html_url,
+                    "description": repo.description,
+                    "stars": repo.stargazers_count,
+                    "forks": repo.forks_count,
+                    "updated_at": repo.updated_at.isoformat() if repo.updated_at else None
+                }
+                for repo in repositories
+            ]
+        }
     except Exception as e:
-        error_details = traceback.format_exc()
-        return f"Error searching repositories: {str(e)}\n\nDetails: {error_details}"
+        return {"error": f"Error searching repositories: {str(e)}", "details": traceback.format_exc()}
 
 
 @mcp.tool()
-async def browse_repository(repo_path: str, path: str = "", branch: str = "", include_content: bool = False) -> str:
+async def browse_repository(repo_path: str, path: str = "", branch: str = "", include_content: bool = False) -> Dict[str, Any]:
     """
     Browse a GitHub repository - provides repository info, lists contents, and retrieves file content.
 
@@ -75,151 +260,102 @@ async def browse_repository(repo_path: str, path: str = "", branch: str = "", in
     try:
         # Validate the repository path format
         if '/' not in repo_path:
-            return f"Error: Invalid repository path '{repo_path}'. Format should be 'owner/repo'."
+            return {"error": f"Invalid repository path '{repo_path}'. Format should be 'owner/repo'."}
+
+        owner, repo_name = repo_path.split('/', 1)
 
-        # Attempt to access the repository
+        # Repository information and the requested path are fetched in a single GraphQL query;
+        # without a branch, HEAD resolves to the repository's default branch
         try:
-            repo = g.get_repo(repo_path)
+            _, response = await _github_query(
+                g.requester.graphql_query,
+                BROWSE_REPOSITORY_QUERY,
+                {
+                    "owner": owner,
+                    "name": repo_name,
+                    "expression": f"{branch or 'HEAD'}:{path}",
+                    "includeContent": include_content
+                }
+            )
+            repo = response["data"]["repository"]
         except Exception as repo_error:
             # Add specific handling for repository not found
-            return f"Error accessing repository '{repo_path}': {str(repo_error)}"
+            return {"error": f"Error accessing repository '{repo_path}': {str(repo_error)}"}
+
+        default_branch = repo["defaultBranchRef"]["name"] if repo["defaultBranchRef"] else None
 
         # If branch is specified, use it, otherwise use default branch
-        ref = branch if branch else repo.default_branch
-
-        # Always include repository info at the beginning
-        repo_info = []
-        repo_info.append("📚 REPOSITORY INFORMATION")
-        repo_info.append("=" * 50)
-        repo_info.append(f"Repository: {repo.full_name}")
-        repo_info.append(f"URL: {repo.html_url}")
-        repo_info.append(f"Description: {repo.description or '(No description)'}")
-        repo_info.append(f"Default Branch: {repo.default_branch}")
-        repo_info.append(f"Current Branch: {ref}")
-        repo_info.append(f"Primary Language: {repo.language or 'Not specified'}")
-
-        # Add statistics in a compact format
-        stats = []
-        stats.append(f"⭐ Stars: {repo.stargazers_count:,}")
-        stats.append(f"🍴 Forks: {repo.forks_count:,}")
-        stats.append(f"⚠️ Issues: {repo.open_issues_count:,}")
-        repo_info.append(" | ".join(stats))
-
-        # Add dates in a compact format
-        dates = []
-        dates.append(f"Created: {repo.created_at.strftime('%Y-%m-%d')}")
-        dates.append(f"Updated: {repo.updated_at.strftime('%Y-%m-%d')}")
-        dates.append(f"Last Push: {repo.pushed_at.strftime('%Y-%m-%d')}")
-        repo_info.append(" | ".join(dates))
-
-        # Add license and visibility
-        if repo.license:
-            repo_info.append(f"License: {repo.license.name}")
-        repo_info.append(f"Visibility: {'Private' if repo.private else 'Public'}")
-
-        # Add clone URLs
-        repo_info.append(f"Clone URL (HTTPS): {repo.clone_url}")
-        repo_info.append(f"Clone URL (SSH): {repo.ssh_url}")
-        repo_info.append("=" * 50)
-        repo_info.append("")  # Empty line for separation
-
-        # Try to get the contents at the specified path
-        try:
-            contents = repo.get_contents(path, ref=ref)
-        except Exception as path_error:
-            # If there's an error accessing the path, still return the repo info
-            # but add the error message
-            return "\n".join(repo_info) + f"\nError accessing path '{path}' in repository: {str(path_error)}"
+        ref = branch if branch else default_branch
+
+        # Always include repository info (open issues include pull requests, as in the REST API)
+        result = {
+            "repo": {
+                "full_name": repo["nameWithOwner"],
+                "url": repo["url"],
+                "description": repo["description"],
+                "default_branch": default_branch,
+                "branch": ref,
+                "language": repo["primaryLanguage"]["name"] if repo["primaryLanguage"] else None,
+                "stars": repo["stargazerCount"],
+                "forks": repo["forkCount"],
+                "open_issues": repo["issues"]["totalCount"] + repo["pullRequests"]["totalCount"],
+                "created_at": repo["createdAt"],
+                "updated_at": repo["updatedAt"],
+                "pushed_at": repo["pushedAt"],
+                "license": repo["licenseInfo"]["name"] if repo["licenseInfo"] else None,
+                "private": repo["isPrivate"],
+                "clone_url": f"{repo['url']}.git",
+                "ssh_url": repo["sshUrl"]
+            }
+        }
+
+        # Get the contents at the specified path
+        contents = repo["object"]
+        if contents is None:
+            # If the path doesn't exist, still return the repo info
+            result["error"] = f"Path '{path}' not found at '{ref}'"
+            return result
 
         # Determine if we're looking at a file or directory
-        if not isinstance(contents, list):
-            # We have a single file
-            file_info = []
-            file_info.append("📄 FILE INFORMATION")
-            file_info.append("-" * 50)
-            file_info.append(f"File: {contents.path}")
-            file_info.append(f"Size: {contents.size:,} bytes")
-            file_info.append(f"SHA: {contents.sha}")
-
-            # If it's a symlink, show the target
-            if hasattr(contents, 'target') and contents.target:
-                file_info.append(f"Symlink to: {contents.target}")
-
-            # Add download URL
-            file_info.append(f"Download URL: {contents.download_url}")
-            file_info.append("-" * 50)
-
-            # Include content if requested
+        if contents["__typename"] == "Blob":
+            result["file"] = {
+                "path": path,
+                "size": contents["byteSize"],
+                "sha": contents["oid"],
+                "binary": contents["isBinary"],
+                "download_url": f"{GITHUB_RAW_URL}/{repo['nameWithOwner']}/{quote(ref)}/{quote(path)}"
+            }
+
+            # Include content if requested (binary files have no text)
             if include_content:
-                file_info.append("")  # Empty line for separation
-                file_info.append("FILE CONTENT")
-                file_info.append("-" * 50)
-                try:
-                    file_content = contents.decoded_content.decode('utf-8')
-                    file_info.append(file_content)
-                except UnicodeDecodeError:
-                    file_info.append("(Binary file - content not displayed)")
-            else:
-                file_info.append("")
-                file_info.append("To view the file content, use include_content=True")
-
-            # Combine repository info and file info
-            return "\n".join(repo_info + file_info)
-
-        # We have a directory listing
-        dir_info = []
-        path_display = path if path else "root"
-        dir_info.append(f"📂 DIRECTORY CONTENTS: '{path_display}'")
-        dir_info.append("-" * 50)
-
-        # Sort contents - directories first, then files
-        dirs = []
-        files = []
-
-        for item in contents:
-            if item.type == "dir":
-                dirs.append(item)
-            else:
-                files.append(item)
-
-        # Add directories to results
-        if dirs:
-            for item in sorted(dirs, key=lambda x: x.path.lower()):
-                dir_name = item.path.split('/')[-1]
-                dir_info.append(f"📁 {dir_name}/")
-        else:
-            dir_info.append("(No subdirectories)")
+                if contents["isTruncated"] and not contents["isBinary"]:
+                    # GraphQL cuts off the text of large files; fetch the whole blob instead
+                    content = await asyncio.to_thread(_get_blob_content, repo["nameWithOwner"], contents["oid"])
+                    result["file"]["content"] = content.decode("utf-8", errors="replace")
+                else:
+                    result["file"]["content"] = contents["text"]
 
-        dir_info.append("")  # Empty line for separation
+            return result
 
-        # Add files to results
-        if files:
-            dir_info.append("FILES:")
-            for item in sorted(files, key=lambda x: x.path.lower()):
-                file_name = item.path.split('/')[-1]
-                file_size = f"{item.size:,} bytes"
-                dir_info.append(f"📄 {file_name} ({file_size})")
-        else:
-            dir_info.append("(No files)")
+        if contents["__typename"] != "Tree":
+            result["error"] = f"Path '{path}' is not a file or directory"
+            return result
 
-        # Add navigation tip
-        dir_info.append("")
-        dir_info.append("-" * 50)
-        dir_info.append("To navigate to a subdirectory, specify its path.")
-        dir_info.append("To view a file, specify its path and set include_content=True.")
+        # Directory listing, directories and files separately
+        entries = contents["entries"]
+        result["contents"] = {
+            "dirs": sorted((item["path"] for item in entries if item["type"] == "tree"), key=str.lower),
+            "files": sorted((item["path"] for item in entries if item["type"] != "tree"), key=str.lower)
+        }
 
-        # Combine repository info and directory info
-        return "\n".join(repo_info + dir_info)
+        return result
 
     except Exception as e:
-        # Add detailed error reporting
-        import traceback
-        error_details = traceback.format_exc()
-        return f"Error browsing repository: {str(e)}\n\nDetails: {error_details}"
+        return {"error": f"Error browsing repository: {str(e)}", "details": traceback.format_exc()}
 
 
 @mcp.tool()
-async def pull_from_repository(repo_path: str, local_dir: str, branch: str = "") -> str:
+async def pull_from_repository(repo_path: str, local_dir: str, branch: str = "") -> Dict[str, Any]:
     """
     Pull changes from a GitHub repository to a local directory.
     Creates the local directory if it doesn't exist.
@@ -232,7 +368,7 @@ async def pull_from_repository(repo_path: str, local_dir: str, branch: str = "")
     try:
         # Validate repo_path format
         if '/' not in repo_path:
-            return f"Error: Invalid repository path '{repo_path}'. Format should be 'owner/repo'."
+            return {"error": f"Invalid repository path '{repo_path}'. Format should be 'owner/repo'."}
 
         # Create local directory if it doesn't exist
         local_path = pathlib.Path(local_dir)
@@ -240,86 +376,70 @@ async def pull_from_repository(repo_path: str, local_dir: str, branch: str = "")
 
         # Get repository
         try:
-            repo = g.get_repo(repo_path)
+            repo = await _get_repo(repo_path)
         except Exception as repo_error:
-            return f"Error accessing repository '{repo_path}': {str(repo_error)}"
+            return {"error": f"Error accessing repository '{repo_path}': {str(repo_error)}"}
 
         # If branch is not specified, use default branch
         if not branch:
             branch = repo.default_branch
 
-        # Load gitignore patterns if present
-        ignore_patterns = _load_gitignore_patterns(local_path)
+        # Build the ignore matcher from .gitignore (if present) and the default patterns
+        ignore_spec = _load_ignore_spec(local_path)
 
-        # Get all files from the repository
-        repo_files = _get_repository_files(repo, branch=branch)
+        # Get all files at the branch head
+        try:
+            commit_sha, repo_files = await asyncio.to_thread(_get_branch_files, repo, branch)
+        except Exception as branch_error:
+            return {"error": f"Error accessing branch '{branch}' of repository '{repo_path}': {str(branch_error)}"}
+
+        # Skip files that match gitignore patterns
+        files_to_pull = {
+            file_path: file_sha for file_path, file_sha in repo_files.items()
+            if not ignore_spec.match_file(file_path)
+        }
+
+        async def pull_file(file_path: str, file_sha: str) -> bool:
+            async with _download_semaphore:
+                return await asyncio.to_thread(
+                    _download_file, repo, commit_sha, file_path, file_sha, local_path / file_path
+                )
+
+        # Download files concurrently
+        results = await asyncio.gather(
+            *[pull_file(file_path, file_sha) for file_path, file_sha in files_to_pull.items()],
+            return_exceptions=True
+        )
 
-        # Download and update local files
         updated_files = []
+        unchanged_files = 0
         errors = []
 
-        for file_path, file_sha in repo_files.items():
-            # Skip if file matches gitignore patterns
-            if _should_ignore_file(file_path, ignore_patterns):
-                continue
-
-            # Get file content from GitHub
-            try:
-                file_content = repo.get_contents(file_path, ref=branch)
-                content = file_content.decoded_content
-
-                # Create local file path
-                local_file_path = local_path / file_path
-
-                # Create directory if it doesn't exist
-                local_file_path.parent.mkdir(parents=True, exist_ok=True)
-
-                # Write content to file
-                with open(local_file_path, 'wb') as f:
-                    f.write(content)
-
+        for file_path, file_result in zip(files_to_pull, results):
+            if isinstance(file_result, Exception):
+                errors.append(f"Error pulling file '{file_path}': {str(file_result)}")
+            elif file_result:
                 updated_files.append(file_path)
-            except Exception as file_error:
-                errors.append(f"Error pulling file '{file_path}': {str(file_error)}")
-
-        # Prepare result
-        result = []
-
-        if updated_files:
-            result.append(f"Successfully pulled {len(updated_files)} files from repository to {local_dir}")
-
-            # List first 10 files and then summarize if there are more
-            if len(updated_files) <= 10:
-                for file in updated_files:
-                    result.append(f"  - {file}")
-            else:
-                for file in updated_files[:10]:
-                    result.append(f"  - {file}")
-                result.append(f"  ... and {len(updated_files) - 10} more files")
-        else:
-            result.append(
-                "No files were pulled from the repository. Either the repository is empty or all files are being ignored.")
-
-        # Add errors if any
-        if errors:
-            result.append("\nWarnings/Errors:")
-            if len(errors) <= 5:
-                result.extend(errors)
             else:
-                result.extend(errors[:5])
-                result.append(f"... and {len(errors) - 5} more errors")
+                unchanged_files += 1
 
-        return "\n".join(result)
+        return {
+            "repository": repo.full_name,
+            "branch": branch,
+            "local_dir": local_dir,
+            "updated": _summarize(updated_files, MAX_LISTED_FILES),
+            "unchanged": unchanged_files,
+            "errors": _summarize(errors, MAX_LISTED_ERRORS)
+        }
 
     except Exception as e:
-        error_details = traceback.format_exc()
-        return f"Error pulling from repository: {str(e)}\n\nDetails: {error_details}"
+        return {"error": f"Error pulling from repository: {str(e)}", "details": traceback.format_exc()}
 
 
 @mcp.tool()
-async def push_to_repository(repo_path: str, local_dir: str, commit_message: str, branch: str = "") -> str:
+async def push_to_repository(repo_path: str, local_dir: str, commit_message: str, branch: str = "") -> Dict[str, Any]:
     """
-    Push local changes to a GitHub repository.
+    Push local changes to a GitHub repository as a single commit.
 
     Args:
         repo_path: Repository path in format 'owner/repo'
@@ -330,171 +450,174 @@ async def push_to_repository(repo_path: str, local_dir: str, commit_message: str
     try:
         # Validate repo_path format
         if '/' not in repo_path:
-            return f"Error: Invalid repository path '{repo_path}'. Format should be 'owner/repo'."
+            return {"error": f"Invalid repository path '{repo_path}'. Format should be 'owner/repo'."}
 
-        user = g.get_user()
         local_path = pathlib.Path(local_dir)
 
         # Check if local directory exists
         if not local_path.exists() or not local_path.is_dir():
-            return f"Error: Local directory '{local_dir}' does not exist"
-
-        # Load gitignore patterns
-        ignore_patterns = _load_gitignore_patterns(local_path)
+            return {"error": f"Local directory '{local_dir}' does not exist"}
 
-        # Scan local directory
-        local_files = _scan_local_directory(local_path, ignore_patterns)
+        # Build the ignore matcher from .gitignore (if present) and the default patterns
+        ignore_spec = _load_ignore_spec(local_path)
 
-        if not local_files:
-            return "Error: No files found in the local directory (empty or all files ignored)"
+        # Scan and hash local files in worker threads while the repository is looked up
+        local_scan = asyncio.create_task(_scan_and_hash_local_files(local_path, ignore_spec))
+        no_files_error = {"error": "No files found in the local directory (empty or all files ignored)"}
 
         # Check if repository exists
         repo_exists = True
         try:
-            repo = g.get_repo(repo_path)
+            repo = await _get_repo(repo_path)
         except Exception:
             repo_exists = False
 
         # Create new repository if it doesn't exist
         if not repo_exists:
+            # Don't create a repository there is nothing to push to
+            local_files, _ = await local_scan
+            if not local_files:
+                return no_files_error
+
             # Extract owner and repo name from repo_path
             parts = repo_path.split('/')
             if len(parts) != 2:
-                return "Error: Invalid repository path format. Use 'owner/repo' format."
+                return {"error": "Invalid repository path format. Use 'owner/repo' format."}
 
             owner, repo_name = parts
 
             # Check if the authenticated user matches the target owner
+            user = await _get_authenticated_user()
             if owner.lower() != user.login.lower():
-                return f"Error: You can only create repositories under your own account ({user.login}), not under '{owner}'"
+                return {"error": f"You can only create repositories under your own account ({user.login}), not under '{owner}'"}
 
-            # Create the repository
+            # Create the repository, initialized with a README so there is a commit to build on
             try:
-                repo = user.create_repo(
+                repo = await _github_call(
+                    user.create_repo,
                     name=repo_name,
                     description="",  # Default empty description
                     private=False,  # Default to public
                     has_issues=True,
                     has_wiki=True,
-                    has_projects=True
+                    has_projects=True,
+                    auto_init=True
                 )
+                _cache_repo(repo_path, repo)
             except Exception as create_error:
-                return f"Error creating repository: {str(create_error)}"
-
-            result = [f"Repository created successfully!"]
-            result.append(f"Name: {repo.name}")
-            result.append(f"URL: {repo.html_url}")
-
-            # Default branch for new GitHub repositories
-            if not branch:
-                branch = "main"
-
-            # Initialize with README if it doesn't exist in local files
-            readme_exists = any(rel_path.lower() == "readme.md" for rel_path in local_files)
-            if not readme_exists:
-                # Create a simple README.md
-                readme_content = f"# {repo.name}\n"
-                try:
-                    repo.create_file(
-                        "README.md",
-                        "Initial commit: Add README",
-                        readme_content,
-                        branch=branch
-                    )
-                    result.append("Created README.md file.")
-                except Exception as readme_error:
-                    result.append(f"Warning: Failed to create README file: {str(readme_error)}")
-        else:
-            # Use existing repository
-            result = [f"Pushing to existing repository: {repo.full_name}"]
+                return {"error": f"Error creating repository: {str(create_error)}"}
+
+        # If branch is not specified, use default branch
+        if not branch:
+            branch = repo.default_branch
+
+        # Get the branch head, creating the branch from the default branch if it doesn't exist
+        added_files = []
+        commit_sha = None
+        try:
+            head_ref = await _github_call(repo.get_git_ref, f"heads/{branch}")
+        except UnknownObjectException:
+            default_ref = await _github_call(repo.get_git_ref, f"heads/{repo.default_branch}")
+            head_ref = await _github_call(repo.create_git_ref, f"refs/heads/{branch}", default_ref.object.sha)
+        except GithubException as ref_error:
+            # An empty repository (409) has no commit to build on, and the Git Data API can't
+            # create blobs in it; make the first commit with one file through the contents API
+            if ref_error.status != 409:
+                raise
+
+            local_files, _ = await local_scan
+            if not local_files:
+                return no_files_error
+
+            seed_path = min(local_files)
+            with open(local_files[seed_path], 'rb') as f:
+                seed_content = f.read()
+
+            seeded = await _github_call(repo.create_file, seed_path, commit_message, seed_content, branch=branch)
+            added_files.append(seed_path)
+            commit_sha = seeded["commit"].sha
+            head_ref = await _github_call(repo.get_git_ref, f"heads/{branch}")
+
+        parent_commit = await _github_call(repo.get_git_commit, head_ref.object.sha)
+
+        # Get existing repository files to compare while local files are scanned and hashed
+        repo_tree, (local_files, local_shas) = await asyncio.gather(
+            asyncio.to_thread(_get_repository_tree, repo, parent_commit.sha),
+            local_scan
+        )
+
+        if not local_files:
+            return no_files_error
 
-            # If branch is not specified, use default branch
-            if not branch:
-                branch = repo.default_branch
+        # Local files that differ from the branch head
+        changed_files = [
+            file_path for file_path in local_files
+            if file_path not in repo_tree or local_shas[file_path] != repo_tree[file_path][0]
+        ]
 
-        # Get existing repository files to compare
-        repo_files = {}
-        if repo_exists:
-            repo_files = _get_repository_files(repo, branch=branch)
+        async def upload_file(file_path: str) -> str:
+            async with _upload_semaphore:
+                return await asyncio.to_thread(_create_blob, repo, local_files[file_path])
 
-        # Add/update all local files
-        files_added = 0
-        files_updated = 0
+        # Upload changed files as blobs concurrently
+        blob_shas = await asyncio.gather(
+            *[upload_file(file_path) for file_path in changed_files],
+            return_exceptions=True
+        )
+
+        updated_files = []
         errors = []
-        processed_files = []
+        tree_elements = []
 
-        for file_path, local_file_path in local_files.items():
-            try:
-                # Read file content
-                with open(local_file_path, 'rb') as f:
-                    content = f.read()
-
-                # Check if file exists in repository
-                file_exists = file_path in repo_files
-
-                if file_exists:
-                    # Update existing file
-                    file_content = repo.get_contents(file_path, ref=branch)
-                    repo.update_file(
-                        file_path,
-                        f"{commit_message}: Update {file_path}",
-                        content,
-                        file_content.sha,
-                        branch=branch
-                    )
-                    files_updated += 1
-                    processed_files.append(f"Updated: {file_path}")
-                else:
-                    # Create new file
-                    repo.create_file(
-                        file_path,
-                        f"{commit_message}: Add {file_path}",
-                        content,
-                        branch=branch
-                    )
-                    files_added += 1
-                    processed_files.append(f"Added: {file_path}")
-            except Exception as file_error:
-                errors.append(f"Failed to process file {file_path}: {str(file_error)}")
-
-        # Add summary of changes
-        if files_added > 0:
-            result.append(f"Added {files_added} new files.")
-        if files_updated > 0:
-            result.append(f"Updated {files_updated} existing files.")
-
-        if files_added == 0 and files_updated == 0:
-            result.append("No files were added or updated.")
-
-        # Show up to 10 processed files
-        if processed_files:
-            result.append("\nProcessed files:")
-            if len(processed_files) <= 10:
-                result.extend([f"  - {file}" for file in processed_files])
-            else:
-                for file in processed_files[:10]:
-                    result.append(f"  - {file}")
-                result.append(f"  ... and {len(processed_files) - 10} more files")
+        for file_path, blob_sha in zip(changed_files, blob_shas):
+            if isinstance(blob_sha, Exception):
+                errors.append(f"Failed to process file {file_path}: {str(blob_sha)}")
+                continue
 
-        # Add errors if any
-        if errors:
-            result.append("\nWarnings/Errors:")
-            if len(errors) <= 5:
-                result.extend([f"  - {err}" for err in errors])
+            # Keep the executable bit of existing files
+            file_exists = file_path in repo_tree
+            mode = "100755" if file_exists and repo_tree[file_path][1] == "100755" else "100644"
+            tree_elements.append(InputGitTreeElement(file_path, mode, "blob", sha=blob_sha))
+
+            if file_exists:
+                updated_files.append(file_path)
             else:
-                for err in errors[:5]:
-                    result.append(f"  - {err}")
-                result.append(f"  ... and {len(errors) - 5} more errors")
+                added_files.append(file_path)
 
-        return "\n".join(result)
+        # Leave the branch untouched rather than commit only part of the changes
+        if errors:
+            return {
+                "error": f"No commit was created: {len(errors)} of {len(changed_files)} files failed to upload",
+                "repository": repo.full_name,
+                "branch": branch,
+                "errors": _summarize(errors, MAX_LISTED_ERRORS)
+            }
+
+        # Create a single commit with all changed files and move the branch to it
+        if tree_elements:
+            new_tree = await _github_call(repo.create_git_tree, tree_elements, parent_commit.tree)
+            new_commit = await _github_call(repo.create_git_commit, commit_message, new_tree, [parent_commit])
+            await _github_call(head_ref.edit, new_commit.sha)
+            commit_sha = new_commit.sha
+
+        return {
+            "repository": repo.full_name,
+            "url": repo.html_url,
+            # A new repository keeps its generated README.md unless a local one replaces it
+            "created": not repo_exists,
+            "branch": branch,
+            "commit": commit_sha,
+            "added": _summarize(added_files, MAX_LISTED_FILES),
+            "updated": _summarize(updated_files, MAX_LISTED_FILES),
+            "errors": _summarize(errors, MAX_LISTED_ERRORS)
+        }
 
     except Exception as e:
-        error_details = traceback.format_exc()
-        return f"Error pushing to repository: {str(e)}\n\nDetails: {error_details}"
+        return {"error": f"Error pushing to repository: {str(e)}", "details": traceback.format_exc()}
 
 
 @mcp.tool()
-async def compare_repository(repo_path: str, local_dir: str, branch: str = "") -> str:
+async def compare_repository(repo_path: str, local_dir: str, branch: str = "") -> Dict[str, Any]:
     """
     Compare local directory with GitHub repository and show differences.
 
@@ -506,145 +629,145 @@ async def compare_repository(repo_path: str, local_dir: str, branch: str = "") -
     try:
         # Validate repo_path format
         if '/' not in repo_path:
-            return f"Error: Invalid repository path '{repo_path}'. Format should be 'owner/repo'."
+            return {"error": f"Invalid repository path '{repo_path}'. Format should be 'owner/repo'."}
 
         # Verify local directory exists
         local_path = pathlib.Path(local_dir)
         if not local_path.exists() or not local_path.is_dir():
-            return f"Error: Local directory '{local_dir}' does not exist"
+            return {"error": f"Local directory '{local_dir}' does not exist"}
 
         # Get repository
         try:
-            repo = g.get_repo(repo_path)
+            repo = await _get_repo(repo_path)
         except Exception as repo_error:
-            return f"Error accessing repository '{repo_path}': {str(repo_error)}"
+            return {"error": f"Error accessing repository '{repo_path}': {str(repo_error)}"}
 
         # If branch is not specified, use default branch
         if not branch:
             branch = repo.default_branch
 
-        # Load gitignore patterns if present
-        ignore_patterns = _load_gitignore_patterns(local_path)
+        # Build the ignore matcher from .gitignore (if present) and the default patterns
+        ignore_spec = _load_ignore_spec(local_path)
 
-        # Get all files from the repository
-        repo_files = _get_repository_files(repo, branch=branch)
+        # Get all files at the branch head while local files are scanned and hashed in worker threads
+        try:
+            (_, repo_files), (local_files, local_shas) = await asyncio.gather(
+                asyncio.to_thread(_get_branch_files, repo, branch),
+                _scan_and_hash_local_files(local_path, ignore_spec)
+            )
+        except Exception as branch_error:
+            return {"error": f"Error accessing branch '{branch}' of repository '{repo_path}': {str(branch_error)}"}
 
-        # Scan local directory
-        local_files = _scan_local_directory(local_path, ignore_patterns)
+        # Local files are already filtered by the scan; filter repository files once
+        repo_files = {path: sha for path, sha in repo_files.items() if not ignore_spec.match_file(path)}
 
         # Identify differences
-        only_in_repo = []
-        only_in_local = []
+        only_in_repo = repo_files.keys() - local_files.keys()
+        only_in_local = local_files.keys() - repo_files.keys()
         modified = []
-        identical = []
+        identical = 0
         comparison_errors = []
 
-        # Files only in repo
-        for repo_file in repo_files:
-            if _should_ignore_file(repo_file, ignore_patterns):
-                continue
+        # Check if content of files in both is different by comparing Git blob SHAs
+        for file_path in sorted(repo_files.keys() & local_files.keys()):
+            local_sha = local_shas[file_path]
 
-            if repo_file not in local_files:
-                only_in_repo.append(repo_file)
+            if isinstance(local_sha, Exception):
+                comparison_errors.append(f"{file_path} (Error comparing: {str(local_sha)})")
+            elif local_sha != repo_files[file_path]:
+                modified.append(file_path)
+            else:
+                identical += 1
+
+        return {
+            "repository": repo.full_name,
+            "branch": branch,
+            "local_dir": local_dir,
+            "in_sync": not only_in_repo and not only_in_local and not modified and not comparison_errors,
+            "only_in_repo": _summarize(sorted(only_in_repo), MAX_LISTED_FILES),
+            "only_in_local": _summarize(sorted(only_in_local), MAX_LISTED_FILES),
+            "modified": _summarize(modified, MAX_LISTED_FILES),
+            "identical": identical,
+            "errors": _summarize(comparison_errors, MAX_LISTED_ERRORS)
+        }
 
-        # Files only in local or modified or identical
-        for local_file, local_path_file in local_files.items():
-            if _should_ignore_file(local_file, ignore_patterns):
-                continue
+    except Exception as e:
+        return {"error": f"Error comparing repository: {str(e)}", "details": traceback.format_exc()}
 
-            if local_file not in repo_files:
-                only_in_local.append(local_file)
-            else:
-                # Check if content is different
-                try:
-                    with open(local_path_file, 'rb') as f:
-                        local_content = f.read()
-
-                    repo_content = repo.get_contents(local_file, ref=branch)
-                    repo_bytes = base64.b64decode(repo_content.content)
-
-                    if repo_bytes != local_content:
-                        modified.append(local_file)
-                    else:
-                        identical.append(local_file)
-                except Exception as compare_error:
-                    comparison_errors.append(f"{local_file} (Error comparing: {str(compare_error)})")
-
-        # Build result message
-        result = []
-        result.append(
-            f"Comparison between local directory '{local_dir}' and repository '{repo_path}' (branch: {branch or repo.default_branch}):")
-        result.append("")
-
-        # Summary stats
-        result.append("SUMMARY:")
-        result.append(f"- Files only in repository: {len(only_in_repo)}")
-        result.append(f"- Files only in local directory: {len(only_in_local)}")
-        result.append(f"- Files modified locally: {len(modified)}")
-        result.append(f"- Files identical: {len(identical)}")
-        if comparison_errors:
-            result.append(f"- Files with comparison errors: {len(comparison_errors)}")
-        result.append("")
-
-        # Details
-        if only_in_repo:
-            result.append("FILES ONLY IN REPOSITORY:")
-            if len(only_in_repo) <= 10:
-                for file in sorted(only_in_repo):
-                    result.append(f"  - {file}")
-            else:
-                for file in sorted(only_in_repo)[:10]:
-                    result.append(f"  - {file}")
-                result.append(f"  ... and {len(only_in_repo) - 10} more files")
-            result.append("")
-
-        if only_in_local:
-            result.append("FILES ONLY IN LOCAL DIRECTORY:")
-            if len(only_in_local) <= 10:
-                for file in sorted(only_in_local):
-                    result.append(f"  - {file}")
-            else:
-                for file in sorted(only_in_local)[:10]:
-                    result.append(f"  - {file}")
-                result.append(f"  ... and {len(only_in_local) - 10} more files")
-            result.append("")
-
-        if modified:
-            result.append("FILES MODIFIED LOCALLY:")
-            if len(modified) <= 10:
-                for file in sorted(modified):
-                    result.append(f"  - {file}")
-            else:
-                for file in sorted(modified)[:10]:
-                    result.append(f"  - {file}")
-                result.append(f"  ... and {len(modified) - 10} more files")
-            result.append("")
-
-        if comparison_errors:
-            result.append("FILES WITH COMPARISON ERRORS:")
-            if len(comparison_errors) <= 10:
-                for file in comparison_errors:
-                    result.append(f"  - {file}")
-            else:
-                for file in comparison_errors[:10]:
-                    result.append(f"  - {file}")
-                result.append(f"  ... and {len(comparison_errors) - 10} more files")
-            result.append("")
 
-        if not only_in_repo and not only_in_local and not modified and not comparison_errors:
-            result.append("Local directory and repository are in sync. All files are identical.")
+# Helper functions
 
-        return "\n".join(result)
+async def _github_call(func, *args, **kwargs):
+    """
+    Run a blocking PyGithub REST call in a worker thread without stalling the event loop.
+    The call is paced by the core rate limit, and the limiter learns from its response.
+    """
+    async with _github_lock:
+        await asyncio.sleep(rate_limiter.reserve())
+        requester = g.requester
+        previous = (requester.rate_limiting, requester.rate_limiting_resettime)
+        try:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        finally:
+            # PyGithub keeps the rate limit headers of its last response; they only change
+            # if the call actually sent a request
+            if (requester.rate_limiting, requester.rate_limiting_resettime) != previous:
+                rate_limiter.record(requester.rate_limiting[0], requester.rate_limiting_resettime)
 
-    except Exception as e:
-        error_details = traceback.format_exc()
-        return f"Error comparing repository: {str(e)}\n\nDetails: {error_details}"
 
+async def _github_query(func, *args, **kwargs):
+    """
+    Run a blocking PyGithub search or GraphQL call in a worker thread.
+    These have their own rate limits, so they neither wait for nor update the core limiter.
+    """
+    async with _github_lock:
+        return await asyncio.to_thread(func, *args, **kwargs)
 
-# Helper functions
 
-def _load_gitignore_patterns(directory: pathlib.Path) -> List[str]:
-    """Load gitignore patterns from the specified directory."""
+async def _get_authenticated_user():
+    """Get the authenticated user, fetching it only on first use."""
+    global _authenticated_user
+
+    if _authenticated_user is None:
+        user = g.get_user()
+        # Load the user's attributes in the worker thread rather than lazily on the event loop
+        await _github_call(lambda: user.login)
+        _authenticated_user = user
+
+    return _authenticated_user
+
+
+async def _get_repo(repo_path: str):
+    """Get a repository by its full name, reusing a recently fetched one."""
+    key = repo_path.lower()
+    cached = _repositories.get(key)
+
+    if cached is not None and time.time() - cached[0] <= REPO_CACHE_TTL:
+        _repositories.move_to_end(key)
+        return cached[1]
+
+    repo = await _github_call(g.get_repo, repo_path)
+    _cache_repo(repo_path, repo)
+    return repo
+
+
+def _cache_repo(repo_path: str, repo) -> None:
+    """Store a repository in the in-memory cache, evicting the least recently used one when full."""
+    key = repo_path.lower()
+    _repositories[key] = (time.time(), repo)
+    _repositories.move_to_end(key)
+
+    if len(_repositories) > REPO_CACHE_SIZE:
+        _repositories.popitem(last=False)
+
+
+def _summarize(items: list, limit: int) -> Dict[str, Any]:
+    """Summarize a list as its length and its first `limit` items."""
+    return {"count": len(items), "sample": items[:limit]}
+
+
+def _load_ignore_spec(directory: pathlib.Path) -> pathspec.PathSpec:
+    """Compile the directory's gitignore patterns and the default ignores into a single matcher."""
     gitignore_path = directory / ".gitignore"
     patterns = []
 
@@ -665,62 +788,238 @@ def _load_gitignore_patterns(directory: pathlib.Path) -> List[str]:
         "*.pyo"
     ])
 
-    return patterns
+    return pathspec.GitIgnoreSpec.from_lines(patterns)
 
 
-def _should_ignore_file(file_path: str, ignore_patterns: List[str]) -> bool:
-    """Check if a file should be ignored based on gitignore patterns."""
-    for pattern in ignore_patterns:
-        if pattern.endswith('/'):
-            # Directory pattern
-            pattern = pattern[:-1]
-            if file_path.startswith(pattern + '/') or file_path == pattern:
-                return True
-        elif fnmatch.fnmatch(file_path, pattern):
-            # File pattern
-            return True
-    return False
+async def _scan_and_hash_local_files(
+    directory: pathlib.Path, ignore_spec: pathspec.PathSpec
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Scan a local directory in the local I/O thread pool, then hash the files found."""
+    loop = asyncio.get_running_loop()
+    local_files = await loop.run_in_executor(_io_pool, _scan_local_directory, directory, ignore_spec)
+    return local_files, await _hash_local_files(local_files)
 
 
-def _get_repository_files(repo, branch: str = "") -> Dict[str, str]:
-    """Get all files from a GitHub repository recursively."""
-    files = {}
+async def _hash_local_files(local_files: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Compute the Git blob SHA of each local file in the local I/O thread pool.
+    Files that could not be read map to the raised exception instead of a SHA.
+    """
+    loop = asyncio.get_running_loop()
+    shas = await asyncio.gather(
+        *[loop.run_in_executor(_io_pool, _hash_local_file, path) for path in local_files.values()],
+        return_exceptions=True
+    )
+    return dict(zip(local_files, shas))
 
-    def get_contents(path: str = ""):
-        try:
-            contents = repo.get_contents(path, ref=branch)
 
-            if not isinstance(contents, list):
-                contents = [contents]
+def _hash_local_file(local_file_path: str) -> str:
+    """Compute the Git blob SHA of a local file, reading it in chunks."""
+    sha = hashlib.sha1(b"blob %d\0" % os.path.getsize(local_file_path))
 
-            for content in contents:
-                if content.type == "dir":
-                    get_contents(content.path)
-                else:
-                    files[content.path] = content.sha
-        except Exception as e:
-            # Log the exception for debugging purposes
-            print(f"Warning: Error accessing {path}: {str(e)}")
+    with open(local_file_path, 'rb') as f:
+        while chunk := f.read(FILE_CHUNK_SIZE):
+            sha.update(chunk)
 
-    get_contents()
-    return files
+    return sha.hexdigest()
 
 
-def _scan_local_directory(directory: pathlib.Path, ignore_patterns: List[str]) -> Dict[str, pathlib.Path]:
-    """Scan local directory recursively and return relative paths."""
+def _get_repository_tree(repo, commit_sha: str) -> Dict[str, Tuple[str, str]]:
+    """
+    Get the (blob SHA, file mode) of every file at a commit using a single recursive tree request.
+    Trees too large for one response are listed subtree by subtree instead.
+    """
     files = {}
+    _walk_tree(repo, commit_sha, "", files)
+    return files
+
+
+def _walk_tree(repo, tree_sha: str, prefix: str, files: Dict[str, Tuple[str, str]]) -> None:
+    """Add the files of a tree (a commit or tree SHA) under the given path prefix."""
+    tree = _get_tree(repo, tree_sha, recursive=True)
+
+    if tree["truncated"]:
+        # GitHub cut the recursive listing short: list this level only and walk each subtree separately
+        tree = _get_tree(repo, tree_sha)
+
+        for element in tree["tree"]:
+            if element["type"] == "tree":
+                _walk_tree(repo, element["sha"], f"{prefix}{element['path']}/", files)
+
+    for element in tree["tree"]:
+        if element["type"] == "blob":
+            files[prefix + element["path"]] = (element["sha"], element["mode"])
+
+
+def _get_tree(repo, tree_sha: str, recursive: bool = False) -> Any:
+    """
+    GET a tree by commit or tree SHA. The listing never changes for a given SHA and the
+    files are cached by commit, so no ETag is kept for revalidation.
+    """
+    response = http.get(
+        f"{repo.url}/git/trees/{tree_sha}",
+        params={"recursive": "1"} if recursive else None,
+        headers={"Accept": "application/vnd.github+json"},
+        timeout=30
+    )
+    response.raise_for_status()
+
+    return response.json()
+
+
+def _get_json(url: str, params: Optional[Dict[str, str]] = None) -> Any:
+    """
+    GET a GitHub API resource, revalidating a previously cached response with its ETag.
+    Unchanged resources (304 Not Modified) don't count against the rate limit.
+    """
+    key = ("etag", url, tuple(sorted((params or {}).items())))
+    cached = cache.get(key)
+
+    headers = {"Accept": "application/vnd.github+json"}
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
+
+    response = http.get(url, params=params, headers=headers, timeout=30)
+    if response.status_code == 304 and cached is not None:
+        return cached[1]
+    response.raise_for_status()
+
+    data = response.json()
+    if "ETag" in response.headers:
+        cache.set(key, (response.headers["ETag"], data))
 
-    for path in directory.glob('**/*'):
-        if path.is_file():
-            # Get path relative to directory
-            rel_path = str(path.relative_to(directory))
+    return data
 
-            # Convert Windows paths to use forward slashes (for GitHub compatibility)
-            rel_path = rel_path.replace('\\', '/')
 
-            # Check if file should be ignored
-            if not _should_ignore_file(rel_path, ignore_patterns):
-                files[rel_path] = path
+def _get_branch_files(repo, branch: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Get the head commit SHA of a branch and the blob SHA of every file at that commit.
+    The branch is revalidated with its ETag on every call (free when it hasn't moved);
+    the files of a commit never change, so they are cached by commit SHA.
+    """
+    commit_sha = _get_json(f"{repo.url}/git/ref/heads/{quote(branch)}")["object"]["sha"]
+
+    key = ("tree", repo.full_name, commit_sha)
+    files = cache.get(key)
+
+    if files is None:
+        files = {path: sha for path, (sha, mode) in _get_repository_tree(repo, commit_sha).items()}
+        cache.set(key, files)
+
+    return commit_sha, files
+
+
+def _download_file(repo, commit_sha: str, file_path: str, file_sha: str, local_file_path: pathlib.Path) -> bool:
+    """
+    Stream a file's raw content at a commit to a local file.
+    Returns False without downloading if the local file already matches the blob SHA.
+    """
+    if local_file_path.is_file() and _hash_local_file(local_file_path) == file_sha:
+        return False
+
+    # Create directory if it doesn't exist
+    local_file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file next to the target and only move it into place once its
+    # content is verified, so a failed download leaves the previous file intact
+    tmp_path = local_file_path.with_name(f".{local_file_path.name}.{os.getpid()}.{threading.get_ident()}.part")
+
+    try:
+        cached = cache.get(("blob", file_sha), read=True)
+        if cached is not None:
+            with cached, open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(cached, f, FILE_CHUNK_SIZE)
+        else:
+            with http.get(
+                f"{GITHUB_RAW_URL}/{repo.full_name}/{commit_sha}/{quote(file_path)}",
+                stream=True,
+                timeout=30
+            ) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+
+                with open(tmp_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, FILE_CHUNK_SIZE)
+
+        # Content is pinned to a commit, so a mismatch means the download is incomplete or altered
+        if _hash_local_file(tmp_path) != file_sha:
+            raise ValueError(f"Downloaded content does not match blob {file_sha}")
+
+        if cached is None:
+            with open(tmp_path, 'rb') as f:
+                cache.set(("blob", file_sha), f, read=True)
+
+        # Keep the permissions of the file being replaced
+        if local_file_path.exists():
+            shutil.copymode(local_file_path, tmp_path)
+        os.replace(tmp_path, local_file_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return True
+
+
+def _get_blob_content(full_name: str, blob_sha: str) -> bytes:
+    """Get the content of a blob by its SHA, from the cache if it was downloaded before."""
+    content = cache.get(("blob", blob_sha))
+    if content is not None:
+        return content
+
+    response = http.get(
+        f"{GITHUB_API_URL}repos/{full_name}/git/blobs/{blob_sha}",
+        headers={"Accept": "application/vnd.github.raw+json"},
+        timeout=30
+    )
+    response.raise_for_status()
+
+    cache.set(("blob", blob_sha), response.content)
+    return response.content
+
+
+def _create_blob(repo, local_file_path: str) -> str:
+    """Upload a local file as a Git blob, base64-encoding its content once, and return the blob SHA."""
+    with open(local_file_path, 'rb') as f:
+        content = base64.b64encode(f.read()).decode("ascii")
+
+    response = http.post(
+        f"{repo.url}/git/blobs",
+        json={"content": content, "encoding": "base64"},
+        headers={"Accept": "application/vnd.github+json"},
+        timeout=60
+    )
+    response.raise_for_status()
+
+    return response.json()["sha"]
+
+
+def _scan_local_directory(directory: pathlib.Path, ignore_spec: pathspec.PathSpec) -> Dict[str, str]:
+    """
+    Scan local directory recursively and return relative paths.
+    Ignored directories are pruned without descending into them.
+    """
+    files = {}
+    # Relative paths always use forward slashes (for GitHub compatibility)
+    stack = [(str(directory), "")]
+
+    while stack:
+        dir_path, dir_rel = stack.pop()
+
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            # Skip directories that can't be read (e.g. permission denied)
+            continue
+
+        with entries:
+            for entry in entries:
+                rel_path = posixpath.join(dir_rel, entry.name)
+
+                if entry.is_dir(follow_symlinks=False):
+                    if not ignore_spec.match_file(rel_path + "/"):
+                        stack.append((entry.path, rel_path))
+                elif entry.is_file() and not ignore_spec.match_file(rel_path):
+                    files[rel_path] = entry.path
 
     return files
 